@@ -1,39 +1,51 @@
 #!/usr/bin/env python3
 """
 PhotoFrame Background Removal Service
-Python Flask app using rembg library for high-quality background removal
+Python Flask app running the rembg U2-Net models on ONNX Runtime
 """
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import base64
-import io
-from PIL import Image
-import rembg
+from werkzeug.exceptions import RequestEntityTooLarge
+import binascii
 import logging
+import os
+from u2net_ort import ImageTooLarge, model_path, pooled_read
+from service_common import (
+    SUPPORTED_MODELS, DEFAULT_FILE_MODEL, DEFAULT_URL_MODEL, MAX_CONTENT_LENGTH, OrjsonProvider,
+    check_upload_length, fetch_bytes,
+    get_worker, clear_workers, loaded_models, content_key, remove_bg_cached,
+    response_etag, not_modified_response, image_response,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)
-
-# Initialize rembg session
-bg_session = None
+app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH  # Werkzeug answers larger bodies with 413 unread
+CORS(app, expose_headers=['X-Model'])
 
 def init_rembg():
-    """Initialize rembg session"""
-    global bg_session
+    """Initialize ONNX Runtime session"""
     try:
-        logger.info("Initializing rembg session...")
-        bg_session = rembg.new_session('u2netp')  # Lighter model (4.7MB vs 176MB)
-        logger.info("✅ rembg session initialized successfully")
+        logger.info("Initializing ONNX Runtime session...")
+        clear_workers()
+        get_worker(DEFAULT_URL_MODEL)  # Lighter model (4.7MB vs 176MB)
+        logger.info("✅ ONNX Runtime session initialized successfully")
         return True
     except Exception as e:
-        logger.error(f"❌ Failed to initialize rembg: {e}")
+        logger.error(f"❌ Failed to initialize ONNX Runtime session: {e}")
         return False
 
+def invalid_model_response(model_name):
+    """Error response for an unsupported model name"""
+    return jsonify({
+        "success": False,
+        "error": f"Unsupported model '{model_name}', expected one of: {', '.join(SUPPORTED_MODELS)}"
+    }), 400
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -41,7 +53,8 @@ def health_check():
         "status": "healthy",
         "service": "background-removal",
         "platform": "local-flask",
-        "rembg_ready": bg_session is not None
+        "rembg_ready": bool(loaded_models()),
+        "loaded_models": loaded_models()
     })
 
 @app.route('/models', methods=['GET'])
@@ -53,21 +66,36 @@ def get_models():
                 "name": "u2net",
                 "description": "General use, best quality",
                 "size": "176MB"
+            },
+            {
+                "name": "u2netp",
+                "description": "Lighter version of u2net",
+                "size": "4.7MB"
+            },
+            {
+                "name": "isnet-general-use",
+                "description": "General purpose ISNet",
+                "size": "43MB"
             }
-        ]
+        ],
+        "defaults": {
+            "remove-background": DEFAULT_FILE_MODEL,
+            "remove-background-url": DEFAULT_URL_MODEL
+        }
     })
 
 @app.route('/remove-background', methods=['POST'])
 def remove_background_file():
     """Remove background from uploaded file"""
     try:
-        if bg_session is None:
+        if not loaded_models():
             return jsonify({
                 "success": False,
-                "error": "rembg session not initialized"
+                "error": "ONNX Runtime session not initialized"
             }), 500
 
         # Get uploaded file
+        check_upload_length()
         if 'image' not in request.files:
             return jsonify({
                 "success": False,
@@ -81,23 +109,26 @@ def remove_background_file():
                 "error": "No file selected"
             }), 400
 
-        # Read image data
-        input_data = file.read()
-
-        # Process with rembg
-        logger.info("Processing image with rembg...")
-        output_data = rembg.remove(input_data, session=bg_session)
+        model_name = request.values.get('model', DEFAULT_FILE_MODEL)
+        if model_name not in SUPPORTED_MODELS:
+            return invalid_model_response(model_name)
 
-        # Convert to base64
-        encoded_string = base64.b64encode(output_data).decode('utf-8')
-        result_data_url = f"data:image/png;base64,{encoded_string}"
+        # Read image data into a pooled buffer and process with ONNX Runtime
+        with pooled_read(file.stream, request.content_length) as input_data:
+            key = content_key(input_data, model_name)
+            etag = response_etag(key)
+            if request.if_none_match.contains(etag):
+                return not_modified_response(etag)
+            output_data = remove_bg_cached(input_data, model_name, key)
 
         logger.info("✅ Background removal completed successfully")
+        return image_response(output_data, model_name, etag)
+
+    except (ImageTooLarge, RequestEntityTooLarge) as e:
         return jsonify({
-            "success": True,
-            "image": result_data_url,
-            "message": "Background removed successfully"
-        })
+            "success": False,
+            "error": str(e)
+        }), 413
 
     except Exception as e:
         logger.error(f"❌ Background removal failed: {e}")
@@ -110,10 +141,10 @@ def remove_background_file():
 def remove_background_url():
     """Remove background from image data URL or URL"""
     try:
-        if bg_session is None:
+        if not loaded_models():
             return jsonify({
                 "success": False,
-                "error": "rembg session not initialized"
+                "error": "ONNX Runtime session not initialized"
             }), 500
 
         data = request.get_json()
@@ -125,36 +156,40 @@ def remove_background_url():
 
         image_data = data['image_data']
 
+        model_name = data.get('model') or request.args.get('model', DEFAULT_URL_MODEL)
+        if model_name not in SUPPORTED_MODELS:
+            return invalid_model_response(model_name)
+
         # Handle different input types
         if image_data.startswith('data:image/'):
             # Extract base64 data
             header, encoded = image_data.split(',', 1)
-            input_data = base64.b64decode(encoded)
+            input_data = binascii.a2b_base64(encoded)
         elif image_data.startswith('http'):
             # Handle URL (fetch from URL)
-            import requests
-            response = requests.get(image_data)
-            input_data = response.content
+            input_data = fetch_bytes(image_data)
         else:
             return jsonify({
                 "success": False,
                 "error": "Invalid image_data format"
             }), 400
 
-        # Process with rembg
-        logger.info("Processing image with rembg...")
-        output_data = rembg.remove(input_data, session=bg_session)
+        key = content_key(input_data, model_name)
+        etag = response_etag(key)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
 
-        # Convert to base64
-        encoded_string = base64.b64encode(output_data).decode('utf-8')
-        result_data_url = f"data:image/png;base64,{encoded_string}"
+        # Process with ONNX Runtime
+        output_data = remove_bg_cached(input_data, model_name, key)
 
         logger.info("✅ Background removal completed successfully")
+        return image_response(output_data, model_name, etag)
+
+    except (ImageTooLarge, RequestEntityTooLarge) as e:
         return jsonify({
-            "success": True,
-            "image": result_data_url,
-            "message": "Background removed successfully"
-        })
+            "success": False,
+            "error": str(e)
+        }), 413
 
     except Exception as e:
         logger.error(f"❌ Background removal failed: {e}")
@@ -166,12 +201,16 @@ def remove_background_url():
 if __name__ == '__main__':
     logger.info("Starting PhotoFrame Background Removal Service...")
 
-    # Initialize rembg
+    # Initialize ONNX Runtime
     if init_rembg():
-        import os
         port = int(os.environ.get('PORT', 5001))  # Railway will set PORT env variable
-        logger.info(f"🚀 Starting Flask server on port {port}")
+        logger.info(f"🚀 Starting Flask dev server on port {port} (use gunicorn -c gunicorn.conf.py app:app in production)")
         app.run(host='0.0.0.0', port=port, debug=False)
     else:
-        logger.error("❌ Failed to start service - rembg initialization failed")
-        exit(1)
\ No newline at end of file
+        logger.error("❌ Failed to start service - ONNX Runtime initialization failed")
+        exit(1)
+elif os.environ.get('GUNICORN_PRELOAD'):
+    # Gunicorn master: only download the weights, each worker opens its session in post_fork
+    model_path(DEFAULT_URL_MODEL)
+else:
+    init_rembg()
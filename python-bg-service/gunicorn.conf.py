@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for the background removal service
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"  # Railway will set PORT env variable
+
+# Few processes with many threads: request threads enqueue into each worker's batching
+# inference thread, so concurrent requests share one ORT call instead of competing for cores
+workers = int(os.environ.get('GUNICORN_WORKERS', max(1, multiprocessing.cpu_count() // 2)))
+worker_class = 'gthread'
+threads = 16
+timeout = 120
+
+# Each worker gets its share of the cores: ONNX Runtime reads GUNICORN_WORKERS when sizing its
+# thread pool, and OpenMP/MKL/Numba pools are pinned before the app is imported so the
+# workers don't oversubscribe the CPU between them
+os.environ['GUNICORN_WORKERS'] = str(workers)
+_threads_per_worker = str(max(1, multiprocessing.cpu_count() // workers))
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+os.environ.setdefault('NUMBA_NUM_THREADS', _threads_per_worker)
+
+# Import the app (and fetch the model weights) once in the master before forking; the
+# master only resolves the weights, sessions are opened per worker in post_fork
+preload_app = True
+os.environ['GUNICORN_PRELOAD'] = '1'
+
+
+def post_fork(server, worker):
+    """ONNX Runtime thread pools don't survive fork(), so each worker opens its own session"""
+    module = sys.modules.get(server.app.app_uri.split(':', 1)[0])
+    if module is not None and hasattr(module, 'init_rembg'):
+        module.init_rembg()
@@ -1,26 +1,43 @@
 #!/usr/bin/env python3
 """
-Background Removal Service using rembg
+Background Removal Service using rembg models on ONNX Runtime
 Based on: https://github.com/geekyscript/BackgroundRemoverOfObject
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify
 from flask_cors import CORS
-import rembg
-from PIL import Image
-import io
-import base64
+from werkzeug.exceptions import RequestEntityTooLarge
+import binascii
 import logging
+import os
+from u2net_ort import ImageTooLarge, model_path, pooled_read
+from service_common import (
+    SUPPORTED_MODELS, DEFAULT_FILE_MODEL, DEFAULT_URL_MODEL, MAX_CONTENT_LENGTH, OrjsonProvider,
+    check_upload_length, fetch_bytes,
+    get_worker, clear_workers, content_key, remove_bg_cached,
+    response_etag, not_modified_response, image_response,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend requests
-
-# Initialize rembg session
-session = rembg.new_session('u2net')  # Use U2Net model (best quality)
+app.json = OrjsonProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH  # Werkzeug answers larger bodies with 413 unread
+CORS(app, expose_headers=['X-Model'])  # Enable CORS for frontend requests
+
+def init_rembg():
+    """Initialize ONNX Runtime sessions (called again per Gunicorn worker after fork)"""
+    clear_workers()
+    get_worker(DEFAULT_FILE_MODEL)
+    return True
+
+if os.environ.get('GUNICORN_PRELOAD'):
+    # Gunicorn master: only download the weights, each worker opens its session in post_fork
+    model_path(DEFAULT_FILE_MODEL)
+else:
+    init_rembg()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -31,11 +48,12 @@ def health_check():
 def remove_background():
     """
     Remove background from uploaded image
-    Accepts: multipart/form-data with 'image' file
-    Returns: JSON with base64 encoded result
+    Accepts: multipart/form-data with 'image' file and optional 'model'
+    Returns: PNG image, or JSON with base64 encoded result for Accept: application/json
     """
     try:
         # Check if image file is present
+        check_upload_length()
         if 'image' not in request.files:
             return jsonify({"error": "No image file provided"}), 400
 
@@ -43,25 +61,29 @@ def remove_background():
         if file.filename == '':
             return jsonify({"error": "No file selected"}), 400
 
-        logger.info(f"Processing image: {file.filename}")
-
-        # Read image data
-        input_data = file.read()
+        model_name = request.values.get('model', DEFAULT_FILE_MODEL)
+        if model_name not in SUPPORTED_MODELS:
+            return jsonify({"error": f"Unsupported model: {model_name}"}), 400
 
-        # Remove background using rembg
-        logger.info("Removing background with U2Net model...")
-        output_data = rembg.remove(input_data, session=session)
+        logger.info(f"Processing image: {file.filename}")
 
-        # Convert to base64 for JSON response
-        output_b64 = base64.b64encode(output_data).decode('utf-8')
+        # Read image data into a pooled buffer and remove background
+        with pooled_read(file.stream, request.content_length) as input_data:
+            key = content_key(input_data, model_name)
+            etag = response_etag(key)
+            if request.if_none_match.contains(etag):
+                return not_modified_response(etag)
+            output_data = remove_bg_cached(input_data, model_name, key)
 
         logger.info("Background removal completed successfully")
 
+        return image_response(output_data, model_name, etag)
+
+    except (ImageTooLarge, RequestEntityTooLarge) as e:
         return jsonify({
-            "success": True,
-            "image": f"data:image/png;base64,{output_b64}",
-            "message": "Background removed successfully"
-        })
+            "success": False,
+            "error": str(e)
+        }), 413
 
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
@@ -74,8 +96,8 @@ def remove_background():
 def remove_background_url():
     """
     Remove background from image URL or base64 data
-    Accepts: JSON with 'image_data' (base64 data URL or URL)
-    Returns: JSON with base64 encoded result
+    Accepts: JSON with 'image_data' (base64 data URL or URL) and optional 'model'
+    Returns: PNG image, or JSON with base64 encoded result for Accept: application/json
     """
     try:
         data = request.get_json()
@@ -85,34 +107,38 @@ def remove_background_url():
 
         image_data = data['image_data']
 
+        model_name = data.get('model') or request.args.get('model', DEFAULT_URL_MODEL)
+        if model_name not in SUPPORTED_MODELS:
+            return jsonify({"error": f"Unsupported model: {model_name}"}), 400
+
         # Handle data URL (base64)
         if image_data.startswith('data:image/'):
             # Extract base64 data
             header, encoded = image_data.split(',', 1)
-            input_data = base64.b64decode(encoded)
+            input_data = binascii.a2b_base64(encoded)
         else:
             # Handle regular URL (fetch from URL)
-            import requests
-            response = requests.get(image_data)
-            response.raise_for_status()
-            input_data = response.content
+            input_data = fetch_bytes(image_data)
 
         logger.info("Processing image from data URL/URL")
 
-        # Remove background using rembg
-        logger.info("Removing background with U2Net model...")
-        output_data = rembg.remove(input_data, session=session)
+        key = content_key(input_data, model_name)
+        etag = response_etag(key)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
 
-        # Convert to base64 for JSON response
-        output_b64 = base64.b64encode(output_data).decode('utf-8')
+        # Remove background with ONNX Runtime
+        output_data = remove_bg_cached(input_data, model_name, key)
 
         logger.info("Background removal completed successfully")
 
+        return image_response(output_data, model_name, etag)
+
+    except (ImageTooLarge, RequestEntityTooLarge) as e:
         return jsonify({
-            "success": True,
-            "image": f"data:image/png;base64,{output_b64}",
-            "message": "Background removed successfully"
-        })
+            "success": False,
+            "error": str(e)
+        }), 413
 
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
@@ -136,11 +162,6 @@ def available_models():
                 "description": "Lighter version of u2net",
                 "size": "4.7MB"
             },
-            {
-                "name": "u2net_human_seg",
-                "description": "Human segmentation",
-                "size": "176MB"
-            },
             {
                 "name": "isnet-general-use",
                 "description": "General purpose ISNet",
@@ -150,8 +171,7 @@ def available_models():
     })
 
 if __name__ == '__main__':
-    import os
     port = int(os.getenv('PORT', 5001))
     logger.info(f"Starting Background Removal Service on port {port}...")
-    logger.info("Using rembg with U2Net model")
+    logger.info("Using U2Net on ONNX Runtime")
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
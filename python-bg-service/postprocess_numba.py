@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Numba kernel for the matte blending step
+Fuses matte normalization, clamping and the premultiplied BGRA blend into one parallel pass
+"""
+
+import threading
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    # cache=True persists the compiled kernel next to this file, so warming it up
+    # at image build time keeps the JIT cost out of worker startup
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _blend_kernel(alpha, image, lo, scale, out):
+        """Normalize, clamp and premultiply one matte row per parallel iteration"""
+        height, width = alpha.shape
+        for i in prange(height):
+            for j in range(width):
+                a = (alpha[i, j] - lo) * scale
+                if a < 0.0:
+                    a = 0.0
+                elif a > 1.0:
+                    a = 1.0
+                out[i, j, 0] = np.uint8(image[i, j, 0] * a)
+                out[i, j, 1] = np.uint8(image[i, j, 1] * a)
+                out[i, j, 2] = np.uint8(image[i, j, 2] * a)
+                out[i, j, 3] = np.uint8(a * 255.0)
+
+    # Numba's default workqueue threading layer can't take parallel launches from
+    # several request threads at once, so launches are serialized (each still uses every core)
+    _LAUNCH_LOCK = threading.Lock()
+
+    def blend(alpha, image, lo, scale, out):
+        """Write image * matte into out[..., :3] and the matte into out[..., 3]"""
+        with _LAUNCH_LOCK:
+            _blend_kernel(alpha, image, lo, scale, out)
+else:
+    blend = None
+
+
+def warm_up():
+    """Compile (or load from cache) the kernel for the dtypes used by the service"""
+    if blend is not None:
+        blend(np.zeros((2, 2), dtype=np.float32), np.zeros((2, 2, 3), dtype=np.uint8),
+              0.0, 1.0, np.empty((2, 2, 4), dtype=np.uint8))
+
+
+if __name__ == '__main__':
+    warm_up()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Shared plumbing for the Flask entry points (app.py and main.py)
+JSON provider, pooled image downloads, per-model inference workers, result cache and response helpers
+"""
+
+import binascii
+import hashlib
+import logging
+import os
+import threading
+
+import cachetools
+import orjson
+import requests
+from flask import Response, jsonify, request
+from flask.json.provider import JSONProvider
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from u2net_ort import MAX_UPLOAD_BYTES, ImageTooLarge, InferenceWorker, create_session, remove_bg_ort
+
+logger = logging.getLogger(__name__)
+
+# Request body limits: the multipart envelope around an upload, and the JSON endpoint's data URLs,
+# which inflate the image by 4/3 in base64
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES * 4 // 3 + MULTIPART_OVERHEAD
+
+# Supported models: uploads default to U2Net (best quality), URLs to the lighter u2netp
+SUPPORTED_MODELS = ('u2net', 'u2netp', 'isnet-general-use')
+DEFAULT_FILE_MODEL = 'u2net'
+DEFAULT_URL_MODEL = 'u2netp'
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)  # accepts bytes directly, no UTF-8 decode pass
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
+
+
+# Pooled HTTP session so image URL fetches reuse TCP/TLS connections
+_HTTP = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2))
+_HTTP.mount('https://', _HTTP_ADAPTER)
+_HTTP.mount('http://', _HTTP_ADAPTER)
+HTTP_TIMEOUT = (3, 30)  # (connect, read) seconds
+
+
+def fetch_bytes(url):
+    """Stream an image download into a buffer pre-sized from Content-Length, up to MAX_UPLOAD_BYTES"""
+    with _HTTP.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        length = int(response.headers.get('Content-Length', 0))
+        if length > MAX_UPLOAD_BYTES:
+            raise ImageTooLarge()
+        buf = bytearray(length or 1 << 20)
+        n = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            if n + len(chunk) > MAX_UPLOAD_BYTES:
+                raise ImageTooLarge()  # Content-Length was missing or lied
+            buf[n:n + len(chunk)] = chunk  # grows the buffer if Content-Length was missing or short
+            n += len(chunk)
+        return bytes(memoryview(buf)[:n])  # one copy, slicing the bytearray would add another
+
+
+def check_upload_length():
+    """Reject an upload from its Content-Length before Werkzeug parses and spools the body"""
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+        raise ImageTooLarge()
+
+
+def b64(data):
+    """Base64-encode bytes to str without the base64 module's extra call layer"""
+    return binascii.b2a_base64(data, newline=False).decode('ascii')
+
+
+# Batching inference workers by model name, each owning one ONNX Runtime session, started lazily on first use
+_WORKERS = {}
+_WORKERS_LOCK = threading.Lock()
+
+
+def get_worker(model_name):
+    """Get the inference worker for a model, loading its session on first use"""
+    worker = _WORKERS.get(model_name)
+    if worker is None:
+        with _WORKERS_LOCK:
+            worker = _WORKERS.get(model_name)
+            if worker is None:
+                worker = InferenceWorker(create_session(model_name))
+                _WORKERS[model_name] = worker
+    return worker
+
+
+def clear_workers():
+    """Forget all loaded sessions (their thread pools don't survive fork)"""
+    with _WORKERS_LOCK:
+        _WORKERS.clear()
+
+
+def loaded_models():
+    """Names of the models with a loaded session in this process"""
+    return sorted(_WORKERS)
+
+
+# Output PNGs keyed by hash of (model, input bytes) so repeat submissions skip inference
+_CACHE = cachetools.LRUCache(maxsize=int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024)), getsizeof=len)
+_CACHE_LOCK = threading.Lock()
+
+
+def content_key(input_data, model_name):
+    """BLAKE2b digest identifying an (input image, model) pair"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model_name.encode())
+    digest.update(b'\0')
+    digest.update(input_data)
+    return digest.hexdigest()
+
+
+def remove_bg_cached(input_data, model_name, key):
+    """Run the model unless this worker already processed the same input"""
+    with _CACHE_LOCK:
+        output_data = _CACHE.get(key)
+    if output_data is not None:
+        logger.info(f"Serving cached result ({model_name})")
+        return output_data
+
+    logger.info(f"Processing image with ONNX Runtime ({model_name})...")
+    output_data = remove_bg_ort(input_data, get_worker(model_name), model_name)
+    with _CACHE_LOCK:
+        try:
+            _CACHE[key] = output_data
+        except ValueError:
+            pass  # Larger than the whole cache
+    return output_data
+
+
+def wants_json():
+    """Clients opt into the base64 JSON envelope with Accept: application/json"""
+    return request.accept_mimetypes.best == 'application/json'
+
+
+def response_etag(key):
+    """ETag of the representation being served, the JSON and PNG bodies differ"""
+    return f'{key}-json' if wants_json() else key
+
+
+def not_modified_response(etag):
+    """304 for a client that already holds this result"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    return response
+
+
+def image_response(output_data, model_name, etag):
+    """Raw PNG by default, base64 data URL JSON only for clients sending Accept: application/json"""
+    if wants_json():
+        response = jsonify({
+            "success": True,
+            "image": f"data:image/png;base64,{b64(output_data)}",
+            "model": model_name,
+            "message": "Background removed successfully"
+        })
+    else:
+        response = Response(output_data, mimetype='image/png', headers={'X-Model': model_name})
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Build-time conversion of U2-Net ONNX weights from FP32 to FP16
+Usage: python tools/convert_fp16.py [model_name ...]
+"""
+
+import logging
+import os
+import sys
+
+import onnx
+from onnxconverter_common import float16
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from u2net_ort import model_dir, fp32_model_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def convert(model_name):
+    """Write <model_name>_fp16.onnx next to the FP32 weights"""
+    src = fp32_model_path(model_name)
+    dst = os.path.join(model_dir(), f'{model_name}_fp16.onnx')
+
+    # keep_io_types leaves the graph inputs/outputs in FP32, ORT casts at the boundary
+    model = float16.convert_float_to_float16(onnx.load(src), keep_io_types=True)
+    onnx.save(model, dst)
+
+    logger.info(f"✅ Wrote {dst}")
+    return dst
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or ['u2net', 'u2netp']:
+        convert(name)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Build-time graph optimization of U2-Net ONNX weights with onnxslim and the ORT optimizer
+Usage: python tools/optimize_onnx.py [--opt-level N] [model_name ...]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+import onnxruntime as ort
+import onnxslim
+from onnxruntime.transformers.fusion_options import FusionOptions
+from onnxruntime.transformers.optimizer import optimize_model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from u2net_ort import model_dir, download_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ORT graph optimization level baked into the file for each --opt-level
+ORT_LEVELS = {
+    0: ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    1: ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    2: ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    99: ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def fusion_options():
+    """UNet fusions minus the ones that emit contrib ops with only CUDA kernels"""
+    options = FusionOptions('unet')
+    options.enable_nhwc_conv = False  # NhwcConv
+    options.enable_group_norm = False  # GroupNorm
+    options.enable_skip_group_norm = False  # SkipGroupNorm
+    return options
+
+
+def optimize(model_name, opt_level=1):
+    """Write <model_name>.slim.opt.onnx next to the FP32 weights"""
+    src = download_model(model_name)
+    dst = os.path.join(model_dir(), f'{model_name}.slim.opt.onnx')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Fold the redundant Reshape/Transpose/constant chains left by the PyTorch export
+        slim_path = os.path.join(tmp, f'{model_name}.slim.onnx')
+        onnxslim.slim(src, slim_path)
+
+        # Python fusions only: with opt_level > 0 the optimizer also runs ORT through a code path that imports torch
+        fused_path = os.path.join(tmp, f'{model_name}.fused.onnx')
+        model = optimize_model(slim_path, model_type='unet', opt_level=0, use_gpu=False,
+                               optimization_options=fusion_options())
+        model.save_model_to_file(fused_path)
+
+        # Let ORT apply its own graph optimizations and save the result; loading it with the
+        # CPU provider doubles as a check that the service can open the file
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ORT_LEVELS[opt_level]
+        options.optimized_model_filepath = os.path.join(tmp, f'{model_name}.slim.opt.onnx')
+        ort.InferenceSession(fused_path, sess_options=options, providers=['CPUExecutionProvider'])
+        if opt_level == 0:
+            os.replace(fused_path, options.optimized_model_filepath)
+        ort.InferenceSession(options.optimized_model_filepath, providers=['CPUExecutionProvider'])
+        os.replace(options.optimized_model_filepath, dst)
+
+    logger.info(f"✅ Wrote {dst}")
+    return dst
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('models', nargs='*', default=['u2net', 'u2netp'])
+    # Levels above 1 bake CPU-specific layouts into the file, only use them when
+    # building on the same hardware (and execution provider) the service runs on
+    parser.add_argument('--opt-level', type=int, default=1, choices=[0, 1, 2, 99])
+    args = parser.parse_args()
+
+    for name in args.models:
+        optimize(name, args.opt_level)
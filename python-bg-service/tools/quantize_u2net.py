@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Build-time static INT8 (QDQ) quantization of U2-Net ONNX weights
+Usage: python tools/quantize_u2net.py --images <calibration_dir> [model_name ...]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import cv2
+import onnx
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from u2net_ort import INPUT_SIZE, model_dir, fp32_model_path, preprocess
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Keep the output activations in float, quantizing them costs matte quality
+EXCLUDED_OP_TYPES = ('Sigmoid', 'Softmax')
+
+
+class U2NetCalibrationReader(CalibrationDataReader):
+    """Feeds representative photos through the same preprocessing as the service"""
+
+    def __init__(self, image_dir, model_name, input_name, size, limit=100):
+        files = sorted(
+            f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS)
+        )[:limit]
+        if not files:
+            raise ValueError(f"No calibration images found in {image_dir}")
+
+        logger.info(f"Calibrating with {len(files)} images from {image_dir}")
+        self.model_name = model_name
+        self.input_name = input_name
+        self.size = size
+        self.paths = iter(os.path.join(image_dir, f) for f in files)
+
+    def get_next(self):
+        path = next(self.paths, None)
+        if path is None:
+            return None
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        return {self.input_name: preprocess(image, self.model_name, self.size)}
+
+
+def quantize(model_name, image_dir, limit):
+    """Write <model_name>_int8.onnx next to the FP32 weights"""
+    src = fp32_model_path(model_name)
+    dst = os.path.join(model_dir(), f'{model_name}_int8.onnx')
+
+    graph = onnx.load(src).graph
+    excluded = [node.name for node in graph.node if node.op_type in EXCLUDED_OP_TYPES]
+
+    input_dims = graph.input[0].type.tensor_type.shape.dim
+    size = (input_dims[3].dim_value, input_dims[2].dim_value) if input_dims[3].dim_value else INPUT_SIZE
+
+    quantize_static(
+        src,
+        dst,
+        U2NetCalibrationReader(image_dir, model_name, graph.input[0].name, size, limit),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=excluded,
+    )
+
+    logger.info(f"✅ Wrote {dst}")
+    return dst
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('models', nargs='*', default=['u2net', 'u2netp'])
+    parser.add_argument('--images', required=True, help="Directory of calibration photos")
+    parser.add_argument('--limit', type=int, default=100, help="Maximum number of calibration photos")
+    args = parser.parse_args()
+
+    for name in args.models:
+        quantize(name, args.images, args.limit)
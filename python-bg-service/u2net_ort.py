@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+U2-Net inference on ONNX Runtime
+Runs the rembg U2-Net models through a tuned onnxruntime session instead of rembg.remove
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from postprocess_numba import blend
+
+logger = logging.getLogger(__name__)
+
+# U2-Net was trained on 320x320 inputs with ImageNet normalization
+INPUT_SIZE = (320, 320)
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# Models that normalize differently from U2-Net (mean, std)
+NORMALIZATION = {
+    'isnet-general-use': (np.full(3, 0.5, dtype=np.float32), np.ones(3, dtype=np.float32)),
+}
+
+# Largest batch fed to ORT in one call, in model-size pixels: 8 images at U2-Net's 320x320,
+# a single image for 1024x1024 ISNet
+BATCH_PIXELS = 8 * INPUT_SIZE[0] * INPUT_SIZE[1]
+
+# Per-thread scratch is only kept for 3-channel tensors up to 320x320, larger models allocate per call
+SCRATCH_MAX_ITEMS = 3 * INPUT_SIZE[0] * INPUT_SIZE[1]
+
+# zlib level for the output PNG
+PNG_COMPRESSION = 3
+
+# Largest upload (or downloaded image) accepted
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+
+# Uploads up to this size reuse a pooled read buffer, larger ones get a buffer sized to the request
+POOLED_BUF_BYTES = 4 * 1024 * 1024
+
+# Per-worker pool of reusable upload buffers and per-thread scratch arrays
+_BUF_POOL = queue.LifoQueue(maxsize=4)
+_local = threading.local()
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload or download exceeds MAX_UPLOAD_BYTES"""
+
+    def __init__(self):
+        super().__init__(f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB upload limit")
+
+
+def model_dir():
+    """Directory holding the ONNX weights (same location rembg downloads to)"""
+    return os.path.expanduser(os.environ.get('U2NET_HOME', os.path.join('~', '.u2net')))
+
+
+def download_model(model_name='u2net'):
+    """Path to the FP32 ONNX file, downloading it through rembg on first use"""
+    path = os.path.join(model_dir(), f'{model_name}.onnx')
+    if not os.path.exists(path):
+        import rembg
+        logger.info(f"Downloading {model_name} weights via rembg...")
+        rembg.new_session(model_name)
+    return path
+
+
+def fp32_model_path(model_name='u2net'):
+    """FP32 weights, preferring the graph-optimized build from tools/optimize_onnx.py"""
+    path = os.path.join(model_dir(), f'{model_name}.slim.opt.onnx')
+    if os.path.exists(path):
+        return path
+    return download_model(model_name)
+
+
+@functools.lru_cache(maxsize=None)
+def cpu_flags():
+    """Instruction set extensions reported by the host CPU"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return frozenset(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return frozenset()
+
+
+def execution_provider():
+    """Execution provider sessions will run on: CUDA, then OpenVINO, then ORT's own CPU kernels"""
+    available = ort.get_available_providers()
+    for provider in ('CUDAExecutionProvider', 'OpenVINOExecutionProvider'):
+        if provider in available:
+            return provider
+    return 'CPUExecutionProvider'
+
+
+def use_fp16(provider):
+    """FP16 weights only pay off where the provider has FP16 kernels: CUDA, or OpenVINO on AVX512-FP16 CPUs"""
+    # ORT's CPU provider has no x86 FP16 convolutions, it casts the graph back to FP32 and runs slower than plain FP32
+    return provider == 'CUDAExecutionProvider' or (
+        provider == 'OpenVINOExecutionProvider' and 'avx512_fp16' in cpu_flags())
+
+
+def use_int8(provider):
+    """Static INT8 kernels only beat FP32 on CPUs with VNNI or AMX dot products"""
+    return provider == 'CPUExecutionProvider' and bool(cpu_flags() & {'avx512_vnni', 'avx_vnni', 'amx_int8'})
+
+
+def model_path(model_name='u2net', provider=None):
+    """Pick the best ONNX variant built for this host and provider, falling back to FP32"""
+    provider = provider or execution_provider()
+    variants = []
+    if use_int8(provider):
+        variants.append('int8')
+    if use_fp16(provider):
+        variants.append('fp16')
+
+    for variant in variants:
+        path = os.path.join(model_dir(), f'{model_name}_{variant}.onnx')
+        if os.path.exists(path):
+            return path
+    return fp32_model_path(model_name)
+
+
+def create_session(model_name='u2net'):
+    """Create an InferenceSession with full graph optimization for the variant its provider runs best"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    # Split the cores between Gunicorn worker processes instead of every worker spinning up one thread per core
+    workers = max(1, int(os.environ.get('GUNICORN_WORKERS', 1)))
+    options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // workers)
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+    provider = execution_provider()
+    path = model_path(model_name, provider)
+    providers = ['CPUExecutionProvider']
+    if provider == 'CUDAExecutionProvider':
+        providers.insert(0, provider)
+    elif provider == 'OpenVINOExecutionProvider':
+        # OpenVINO dispatches the conv kernels to VNNI/AMX on Intel CPUs where MLAS may not
+        providers.insert(0, (provider, {
+            'device_type': 'CPU_FP16' if path.endswith('_fp16.onnx') else 'CPU_FP32',
+            'num_of_threads': options.intra_op_num_threads,
+        }))
+
+    logger.info(f"Loading {os.path.basename(path)} with {provider}")
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+
+def input_size(session):
+    """(width, height) the model was exported for, 320x320 for the U2-Net family"""
+    shape = session.get_inputs()[0].shape
+    return (shape[3], shape[2]) if isinstance(shape[3], int) else INPUT_SIZE
+
+
+def _acquire_buf(size):
+    """Take a pooled upload buffer if one fits, otherwise allocate one of exactly size bytes"""
+    if size <= POOLED_BUF_BYTES:
+        try:
+            return _BUF_POOL.get_nowait()
+        except queue.Empty:
+            pass
+    return bytearray(size)
+
+
+def _release_buf(buf):
+    """Return a pool-sized upload buffer to the pool, dropping one-off and surplus buffers"""
+    if len(buf) != POOLED_BUF_BYTES:
+        return
+    try:
+        _BUF_POOL.put_nowait(buf)
+    except queue.Full:
+        pass
+
+
+# Fill the pool up front so a miss is the exception rather than every cold start
+for _ in range(_BUF_POOL.maxsize):
+    _release_buf(bytearray(POOLED_BUF_BYTES))
+
+
+@contextlib.contextmanager
+def pooled_read(stream, size_hint=None):
+    """Read a file stream into a pooled buffer and yield a memoryview of the data"""
+    # size_hint bounds the stream length (the request's Content-Length), so an upload
+    # that misses the pool only allocates what it needs instead of the full limit
+    buf = _acquire_buf(min(size_hint or MAX_UPLOAD_BYTES, MAX_UPLOAD_BYTES))
+    try:
+        view = memoryview(buf)[:MAX_UPLOAD_BYTES]
+        n = 0
+        while n < len(view):
+            read = stream.readinto(view[n:])
+            if not read:
+                break
+            n += read
+        else:
+            if stream.read(1):
+                raise ImageTooLarge()
+        yield view[:n]
+    finally:
+        _release_buf(buf)
+
+
+def _scratch(name, shape, dtype):
+    """Per-thread scratch array for the fixed model-size tensors, viewed with the requested shape"""
+    count = int(np.prod(shape))
+    if count > SCRATCH_MAX_ITEMS:
+        return np.empty(shape, dtype=dtype)
+
+    buffers = getattr(_local, 'scratch', None)
+    if buffers is None:
+        buffers = _local.scratch = {}
+
+    buf = buffers.get(name)
+    if buf is None or buf.size < count or buf.dtype != dtype:
+        buf = buffers[name] = np.empty(count, dtype=dtype)
+    return buf[:count].reshape(shape)
+
+
+def decode(input_bytes):
+    """Decode encoded image bytes (or a memoryview over them) into a BGR uint8 array"""
+    image = cv2.imdecode(np.frombuffer(input_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unsupported or corrupt image data")
+    return image
+
+
+def preprocess(image, model_name='u2net', size=INPUT_SIZE, out=None):
+    """Resize and normalize a BGR image into a 1x3xHxW float32 RGB tensor"""
+    mean, std = NORMALIZATION.get(model_name, (MEAN, STD))
+    if out is None:
+        out = np.empty((1, 3, size[1], size[0]), dtype=np.float32)
+
+    height, width = image.shape[:2]
+    interpolation = cv2.INTER_AREA if width > size[0] or height > size[1] else cv2.INTER_LINEAR
+    resized = cv2.resize(image, size, dst=_scratch('resized', (size[1], size[0], 3), np.uint8),
+                         interpolation=interpolation)
+
+    # rembg scales by the image maximum before mean/std; fold both into one multiply and subtract
+    scale = 1.0 / max(int(resized.max()), 1)
+    chw = resized[:, :, ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW view, no copy
+    np.multiply(chw, (scale / std)[:, None, None], out=out[0])
+    np.subtract(out[0], (mean / std)[:, None, None], out=out[0])
+    return out
+
+
+def postprocess(pred, image):
+    """Blend the predicted matte into a BGRA cutout of the original image"""
+    height, width = image.shape[:2]
+    pred = pred[0, 0]
+    lo, hi = float(pred.min()), float(pred.max())
+
+    scale = 1.0 / max(hi - lo, 1e-6)
+
+    # Inference ran at the model size; only the 1-channel matte is upscaled back to the original.
+    # Full-resolution buffers are allocated per call, per-thread scratch would pin the largest
+    # photo each request thread has ever seen
+    alpha = cv2.resize(pred, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    # Colour is premultiplied by the matte, same as rembg's naive cutout
+    cutout = np.empty((height, width, 4), dtype=np.uint8)
+    if blend is not None:
+        blend(alpha, image, lo, scale, cutout)
+        return cutout
+
+    np.subtract(alpha, lo, out=alpha)
+    np.multiply(alpha, scale, out=alpha)
+    np.clip(alpha, 0.0, 1.0, out=alpha)
+    np.multiply(image, alpha[:, :, None], out=cutout[:, :, :3], casting='unsafe')
+    np.multiply(alpha, 255.0, out=cutout[:, :, 3], casting='unsafe')
+    return cutout
+
+
+class InferenceWorker(threading.Thread):
+    """Owns one ORT session and runs queued requests through it in batches"""
+
+    def __init__(self, session, max_batch=8, window=0.005):
+        super().__init__(name='u2net-inference', daemon=True)
+        self.session = session
+        self.size = input_size(session)
+        self.window = window
+        self.requests = queue.Queue()
+
+        # Models exported with a fixed batch size still get a single owner thread, just no batching;
+        # larger inputs get proportionally smaller batches so the IOBinding arrays stay bounded
+        width, height = self.size
+        batch_dim = session.get_inputs()[0].shape[0]
+        self.max_batch = batch_dim if isinstance(batch_dim, int) else max(1, min(max_batch, BATCH_PIXELS // (width * height)))
+
+        # ORT reads the batch from and writes the d0 mattes into these arrays through IOBinding
+        self.input_arr = np.empty((self.max_batch, 3, height, width), dtype=np.float32)
+        self.output_arr = np.empty((self.max_batch, 1, height, width), dtype=np.float32)
+        self.io = session.io_binding()
+        self.input_name = session.get_inputs()[0].name
+        self.output_name = session.get_outputs()[0].name
+
+        self.start()
+
+    def submit(self, tensor):
+        """Queue a 1x3xHxW tensor; the Future resolves to its 1x1xHxW matte"""
+        future = Future()
+        self.requests.put((tensor, future))
+        return future
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch or time window is full"""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return [(tensor, future) for tensor, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run_batch(self, batch):
+        """Run one batched inference and hand each request its own copy of the matte"""
+        count = len(batch)
+        width, height = self.size
+        for i, (tensor, _) in enumerate(batch):
+            self.input_arr[i] = tensor[0]
+
+        self.io.bind_input(self.input_name, 'cpu', 0, np.float32,
+                           (count, 3, height, width), self.input_arr.ctypes.data)
+        self.io.bind_output(self.output_name, 'cpu', 0, np.float32,
+                            (count, 1, height, width), self.output_arr.ctypes.data)
+        self.session.run_with_iobinding(self.io)
+
+        for i, (_, future) in enumerate(batch):
+            future.set_result(self.output_arr[i:i + 1].copy())
+
+    def run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Batched inference failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+def remove_bg_ort(input_bytes, worker, model_name='u2net'):
+    """Remove the background from encoded image bytes and return PNG bytes"""
+    image = decode(input_bytes)
+
+    width, height = worker.size
+    tensor = preprocess(image, model_name, worker.size, _scratch('input', (1, 3, height, width), np.float32))
+    pred = worker.submit(tensor).result()
+
+    # Level 3 is the bandwidth vs. CPU sweet spot: cheaper than PIL's 6, smaller than OpenCV's 1
+    ok, png = cv2.imencode('.png', postprocess(pred, image), [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return png.tobytes()
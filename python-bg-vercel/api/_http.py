@@ -0,0 +1,65 @@
+"""
+Shared HTTP helpers for the API functions (the leading underscore keeps Vercel from deploying it as an endpoint)
+Image downloads, base64 encoding and the response methods mixed into each handler
+"""
+
+import binascii
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Pooled HTTP session, reused while Vercel keeps the container warm
+_HTTP = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2))
+_HTTP.mount('https://', _HTTP_ADAPTER)
+_HTTP.mount('http://', _HTTP_ADAPTER)
+HTTP_TIMEOUT = (3, 30)  # (connect, read) seconds
+
+# Largest image accepted from a URL
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+
+class ImageTooLarge(ValueError):
+    """Raised when a download exceeds MAX_UPLOAD_BYTES"""
+
+    def __init__(self):
+        super().__init__(f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit")
+
+def fetch_bytes(url):
+    """Stream an image download into a buffer pre-sized from Content-Length, up to MAX_UPLOAD_BYTES"""
+    with _HTTP.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        length = int(response.headers.get('Content-Length', 0))
+        if length > MAX_UPLOAD_BYTES:
+            raise ImageTooLarge()
+        buf = bytearray(length or 1 << 20)
+        n = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            if n + len(chunk) > MAX_UPLOAD_BYTES:
+                raise ImageTooLarge()  # Content-Length was missing or lied
+            buf[n:n + len(chunk)] = chunk  # grows the buffer if Content-Length was missing or short
+            n += len(chunk)
+        return bytes(memoryview(buf)[:n])  # one copy, slicing the bytearray would add another
+
+def b64(data):
+    """Base64-encode bytes to str without the base64 module's extra call layer"""
+    return binascii.b2a_base64(data, newline=False).decode('ascii')
+
+class ResponseMixin:
+    """Response helpers for BaseHTTPRequestHandler subclasses"""
+
+    def send_body(self, body, content_type='application/json', extra_headers=None):
+        """Send a 200 response with CORS headers"""
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def wants_json(self):
+        """Clients opt into the base64 JSON envelope with Accept: application/json"""
+        accept = self.headers.get('Accept', '')
+        return accept.split(',')[0].split(';')[0].strip() == 'application/json'
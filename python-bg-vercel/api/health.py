@@ -1,5 +1,5 @@
 from http.server import BaseHTTPRequestHandler
-import json
+import orjson
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -16,5 +16,5 @@ class handler(BaseHTTPRequestHandler):
             "platform": "vercel"
         }
 
-        self.wfile.write(json.dumps(response).encode())
+        self.wfile.write(orjson.dumps(response))
         return
\ No newline at end of file
@@ -1,5 +1,5 @@
 from http.server import BaseHTTPRequestHandler
-import json
+import orjson
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -35,5 +35,5 @@ class handler(BaseHTTPRequestHandler):
             ]
         }
 
-        self.wfile.write(json.dumps(models).encode())
+        self.wfile.write(orjson.dumps(models))
         return
\ No newline at end of file
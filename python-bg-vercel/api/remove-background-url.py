@@ -1,11 +1,33 @@
 from http.server import BaseHTTPRequestHandler
-import json
-import base64
+import asyncio
+import orjson
+import binascii
+import httpx
 import io
-import requests
 import os
+import sys
 
-class handler(BaseHTTPRequestHandler):
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _http import ResponseMixin, fetch_bytes, b64
+
+async def _post_first_success(api_urls, headers, input_data):
+    """Post to every model at once over one HTTP/2 connection, return the first 200 body"""
+    async with httpx.AsyncClient(timeout=30, http2=True) as client:
+        tasks = [asyncio.ensure_future(client.post(url, headers=headers, content=input_data)) for url in api_urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    response = await next_done
+                except Exception:
+                    continue  # any failure just drops this model, another may still answer
+                if response.status_code == 200:
+                    return response.content
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()  # no-op for the finished ones
+
+class handler(ResponseMixin, BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -16,20 +38,12 @@ class handler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         try:
-            # Set CORS headers
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-
             # Read JSON data
             content_length = int(self.headers.get('Content-Length', 0))
             post_data = self.rfile.read(content_length)
 
             try:
-                json_data = json.loads(post_data.decode())
+                json_data = orjson.loads(post_data)
                 image_data = json_data.get('image_data', '')
 
                 if not image_data:
@@ -38,18 +52,16 @@ class handler(BaseHTTPRequestHandler):
                 if image_data.startswith('data:image/'):
                     # Extract base64 data
                     header, encoded = image_data.split(',', 1)
-                    input_data = base64.b64decode(encoded)
+                    input_data = binascii.a2b_base64(encoded)
                 else:
                     # Handle URL (fetch from URL)
-                    import urllib.request
-                    with urllib.request.urlopen(image_data) as response:
-                        input_data = response.read()
+                    input_data = fetch_bytes(image_data)
 
             except Exception as e:
-                self.wfile.write(json.dumps({
+                self.send_body(orjson.dumps({
                     "success": False,
                     "error": f"Failed to process image data: {str(e)}"
-                }).encode())
+                }))
                 return
 
             # Process with HuggingFace API (working endpoint)
@@ -62,21 +74,18 @@ class handler(BaseHTTPRequestHandler):
                 "https://api-inference.huggingface.co/models/Xenova/modnet"
             ]
 
-            output_data = None
-            for api_url in api_urls:
-                try:
-                    response = requests.post(api_url, headers=headers, data=input_data, timeout=30)
-                    if response.status_code == 200:
-                        output_data = response.content
-                        break
-                except:
-                    continue
+            # Timeouts no longer stack, the first model to answer wins
+            output_data = asyncio.run(_post_first_success(api_urls, headers, input_data))
 
             if output_data is None:
                 raise Exception("All HuggingFace models failed")
 
-            # Convert to base64
-            output_b64 = base64.b64encode(output_data).decode('utf-8')
+            # Raw PNG unless the client asked for the base64 JSON envelope
+            if not self.wants_json():
+                self.send_body(output_data, 'image/png')
+                return
+
+            output_b64 = b64(output_data)
 
             response = {
                 "success": True,
@@ -84,14 +93,14 @@ class handler(BaseHTTPRequestHandler):
                 "message": "Background removed successfully"
             }
 
-            self.wfile.write(json.dumps(response).encode())
+            self.send_body(orjson.dumps(response))
 
         except Exception as e:
             error_response = {
                 "success": False,
                 "error": str(e)
             }
-            self.wfile.write(json.dumps(error_response).encode())
+            self.send_body(orjson.dumps(error_response))
 
     def do_GET(self):
         self.send_response(200)
@@ -102,4 +111,4 @@ class handler(BaseHTTPRequestHandler):
         response = {
             "message": "Background removal endpoint for URLs and base64 data. Use POST with JSON."
         }
-        self.wfile.write(json.dumps(response).encode())
\ No newline at end of file
+        self.wfile.write(orjson.dumps(response))
\ No newline at end of file
@@ -1,14 +1,46 @@
 from http.server import BaseHTTPRequestHandler
-import json
-import base64
+import orjson
+import binascii
 import io
 import urllib.parse
+import functools
+import os
+import sys
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import ValueTarget
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _http import ResponseMixin, fetch_bytes, b64
+
+# Weights bundled with the deployment land under /var/task/models (read-only); anything
+# not bundled is downloaded into /tmp, the only writable path in the function container
+_BUNDLED_MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+_DOWNLOADED_MODELS = '/tmp/.u2net'
+
+def model_home(model_name):
+    """Directory rembg should load a model from, the bundled one only if it ships that model"""
+    if os.path.exists(os.path.join(_BUNDLED_MODELS, f'{model_name}.onnx')):
+        return _BUNDLED_MODELS
+    return _DOWNLOADED_MODELS
+
 try:
     import rembg
 except ImportError:
     rembg = None
 
-class handler(BaseHTTPRequestHandler):
+# Uploads default to U2Net for quality, data URLs / URLs to the lighter u2netp
+SUPPORTED_MODELS = ('u2net', 'u2netp', 'isnet-general-use')
+DEFAULT_FILE_MODEL = 'u2net'
+DEFAULT_URL_MODEL = 'u2netp'
+
+@functools.lru_cache(maxsize=None)
+def get_session(model_name='u2net'):
+    """Load the model on the first request; Vercel reuses warm containers between invocations"""
+    # rembg reads U2NET_HOME when the session is created, so it can differ per model
+    os.environ['U2NET_HOME'] = model_home(model_name)
+    return rembg.new_session(model_name)
+
+class handler(ResponseMixin, BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -19,106 +51,107 @@ class handler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         try:
-            # Set CORS headers
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-
             # Get content length
             content_length = int(self.headers.get('Content-Length', 0))
 
             if content_length == 0:
-                self.wfile.write(json.dumps({
+                self.send_body(orjson.dumps({
                     "success": False,
                     "error": "No data provided"
-                }).encode())
+                }))
                 return
 
-            # Read the request body
-            post_data = self.rfile.read(content_length)
-
             # Handle different content types
             content_type = self.headers.get('Content-Type', '')
 
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            model_name = query.get('model', [DEFAULT_FILE_MODEL])[0]
+
             if 'multipart/form-data' in content_type:
-                # Handle file upload
-                input_data = self.parse_multipart(post_data, content_type)
+                # Handle file upload, streamed from the socket into the parser; a 'model' form field wins over the query
+                input_data, form_model = self.parse_multipart(content_length, content_type)
+                model_name = form_model or model_name
             elif 'application/json' in content_type:
                 # Handle JSON with base64 data
+                post_data = self.rfile.read(content_length)
                 try:
-                    json_data = json.loads(post_data.decode())
+                    json_data = orjson.loads(post_data)
                     image_data = json_data.get('image_data', '')
+                    model_name = json_data.get('model') or query.get('model', [DEFAULT_URL_MODEL])[0]
 
                     if image_data.startswith('data:image/'):
                         # Extract base64 data
                         header, encoded = image_data.split(',', 1)
-                        input_data = base64.b64decode(encoded)
+                        input_data = binascii.a2b_base64(encoded)
                     else:
                         # Handle URL (fetch from URL)
-                        import urllib.request
-                        with urllib.request.urlopen(image_data) as response:
-                            input_data = response.read()
+                        input_data = fetch_bytes(image_data)
                 except Exception as e:
-                    self.wfile.write(json.dumps({
+                    self.send_body(orjson.dumps({
                         "success": False,
                         "error": f"Failed to parse JSON: {str(e)}"
-                    }).encode())
+                    }))
                     return
             else:
                 # Assume raw image data
-                input_data = post_data
+                input_data = self.rfile.read(content_length)
 
             # Process with rembg library
             if rembg is None:
                 raise Exception("rembg library not available")
 
-            # Use rembg to remove background
-            output_data = rembg.remove(input_data)
+            if model_name not in SUPPORTED_MODELS:
+                raise Exception(f"Unsupported model: {model_name}")
+
+            # Use rembg to remove background with the warm session
+            output_data = rembg.remove(input_data, session=get_session(model_name))
+
+            # Raw PNG unless the client asked for the base64 JSON envelope
+            if not self.wants_json():
+                self.send_body(output_data, 'image/png', {
+                    'X-Model': model_name,
+                    'Access-Control-Expose-Headers': 'X-Model'
+                })
+                return
 
-            # Convert to base64
-            output_b64 = base64.b64encode(output_data).decode('utf-8')
+            output_b64 = b64(output_data)
 
             response = {
                 "success": True,
                 "image": f"data:image/png;base64,{output_b64}",
+                "model": model_name,
                 "message": "Background removed successfully"
             }
 
-            self.wfile.write(json.dumps(response).encode())
+            self.send_body(orjson.dumps(response))
 
         except Exception as e:
             error_response = {
                 "success": False,
                 "error": str(e)
             }
-            self.wfile.write(json.dumps(error_response).encode())
+            self.send_body(orjson.dumps(error_response))
 
-    def parse_multipart(self, data, content_type):
-        """Simple multipart parser for file uploads"""
+    def parse_multipart(self, content_length, content_type):
+        """Stream the multipart body into the 'image' and 'model' fields without buffering the whole payload"""
         try:
-            # Extract boundary
-            boundary = content_type.split('boundary=')[1]
-            if boundary.startswith('"') and boundary.endswith('"'):
-                boundary = boundary[1:-1]
-
-            # Split by boundary
-            parts = data.split(f'--{boundary}'.encode())
-
-            for part in parts:
-                if b'filename=' in part and b'Content-Type: image/' in part:
-                    # Find the start of file data (after double newline)
-                    header_end = part.find(b'\r\n\r\n')
-                    if header_end != -1:
-                        file_data = part[header_end + 4:]
-                        # Remove trailing boundary markers
-                        if file_data.endswith(b'\r\n'):
-                            file_data = file_data[:-2]
-                        return file_data
-
-            raise Exception("No image file found in multipart data")
+            parser = StreamingFormDataParser(headers={'Content-Type': content_type})
+            target = ValueTarget()
+            model_target = ValueTarget()
+            parser.register('image', target)
+            parser.register('model', model_target)
+
+            remaining = content_length
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                parser.data_received(chunk)
+                remaining -= len(chunk)
+
+            if not target.value:
+                raise Exception("No image file found in multipart data")
+            return target.value, model_target.value.decode()
 
         except Exception as e:
             raise Exception(f"Failed to parse multipart data: {str(e)}")
@@ -132,4 +165,4 @@ class handler(BaseHTTPRequestHandler):
         response = {
             "message": "Background removal endpoint. Use POST with image data."
         }
-        self.wfile.write(json.dumps(response).encode())
\ No newline at end of file
+        self.wfile.write(orjson.dumps(response))
\ No newline at end of file
@@ -17,6 +17,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load the model once per worker process instead of on every request
+session = rembg.new_session("u2net")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "background-removal"}
@@ -32,7 +35,7 @@ async def remove_background(file: UploadFile = File(...)):
         image_data = await file.read()
 
         # Remove background using rembg
-        output_data = rembg.remove(image_data)
+        output_data = rembg.remove(image_data, session=session)
 
         # Return the processed image
         return Response(
@@ -47,4 +50,5 @@ async def remove_background(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 if __name__ == "__main__":
+    # Development only, the container runs `uvicorn app:app --workers N`
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -67,6 +67,35 @@ export const removeBackgroundBackend = async (imageData: string | Blob | File):
   }
 };
 
+// Convert a PNG blob into the data URL the editor stores
+const blobToDataUrl = (blob: Blob): Promise<string> =>
+  new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result as string);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(blob);
+  });
+
+// Services answer with the raw PNG; errors (and older deployments) still come back as JSON
+const readImageResponse = async (response: Response): Promise<string> => {
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(`Backend API error: ${response.status} - ${errorText}`);
+  }
+
+  if (response.headers.get('Content-Type')?.includes('application/json')) {
+    const result = await response.json();
+
+    if (!result.success) {
+      throw new Error(result.error || 'Backend processing failed');
+    }
+
+    return result.image;
+  }
+
+  return blobToDataUrl(await response.blob());
+};
+
 // Remove background from data URL
 const removeBackgroundFromDataURL = async (baseUrl: string, dataUrl: string): Promise<string> => {
   const apiPath = baseUrl.includes('vercel.app') ? '/api/remove-background-url' : '/remove-background-url';
@@ -74,6 +103,8 @@ const removeBackgroundFromDataURL = async (baseUrl: string, dataUrl: string): Pr
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
+      // Raw PNG is a third smaller than the base64 JSON envelope
+      'Accept': 'image/png',
     },
     body: JSON.stringify({
       image_data: dataUrl
@@ -81,18 +112,7 @@ const removeBackgroundFromDataURL = async (baseUrl: string, dataUrl: string): Pr
     signal: AbortSignal.timeout(30000) // 30 second timeout
   });
 
-  if (!response.ok) {
-    const errorText = await response.text();
-    throw new Error(`Backend API error: ${response.status} - ${errorText}`);
-  }
-
-  const result = await response.json();
-
-  if (!result.success) {
-    throw new Error(result.error || 'Backend processing failed');
-  }
-
-  return result.image;
+  return readImageResponse(response);
 };
 
 // Remove background from file
@@ -103,22 +123,14 @@ const removeBackgroundFromFile = async (baseUrl: string, file: Blob | File): Pro
   const apiPath = baseUrl.includes('vercel.app') ? '/api/remove-background' : '/remove-background';
   const response = await fetch(`${baseUrl}${apiPath}`, {
     method: 'POST',
+    headers: {
+      'Accept': 'image/png',
+    },
     body: formData,
     signal: AbortSignal.timeout(30000) // 30 second timeout
   });
 
-  if (!response.ok) {
-    const errorText = await response.text();
-    throw new Error(`Backend API error: ${response.status} - ${errorText}`);
-  }
-
-  const result = await response.json();
-
-  if (!result.success) {
-    throw new Error(result.error || 'Backend processing failed');
-  }
-
-  return result.image;
+  return readImageResponse(response);
 };
 
 // Check if backend service is available